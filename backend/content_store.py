@@ -0,0 +1,476 @@
+"""
+Sharded content store for candidate metadata.
+
+Metadata sources (JSON arrays, JSONL files and directories of pipeline runs) are
+streamed item by item, deduplicated by videoId and appended to JSONL shard files.
+A small index maps each videoId to its shard, byte offset, version and source file,
+and is swapped in atomically so the API picks up new pipeline runs without a restart.
+Ingest and compaction hold an exclusive writer lock, so they can run alongside the
+API and each other safely.
+
+The version of an item is its first timestamp field in VERSION_FIELDS (epoch seconds
+or ISO 8601), falling back to the modification time of the file it was read from.
+File times are reset by copies that do not preserve them (cp, rsync without -p), so
+pipelines should include a timestamp field where possible. Within one file, later
+records replace earlier ones with the same version.
+
+Usage:
+    python content_store.py ingest /path/to/pipeline_run [more sources...]
+    python content_store.py compact
+"""
+from typing import List, Dict, Any, Optional, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import argparse
+import hashlib
+import heapq
+import json
+import logging
+import os
+import shutil
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = "content-store"
+DEFAULT_NUM_SHARDS = 16
+READ_CHUNK_SIZE = 1 << 16
+REQUIRED_FIELDS = ("videoId", "title", "author")
+VERSION_FIELDS = ("updatedAt", "updated_at", "fetchedAt", "fetched_at")
+
+# Index items are compact lists: [shard, offset, version, source id, content flags, record hash]
+ENTRY_SHARD, ENTRY_OFFSET, ENTRY_VERSION, ENTRY_SOURCE, ENTRY_CONTENT, ENTRY_HASH = range(6)
+HAS_ARTICLE = 1
+HAS_INSIGHTS = 2
+
+
+def iter_json_array(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the objects of a top-level JSON array without loading the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+
+        while True:
+            # Skip whitespace and separators between array items
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"Expected a JSON array in {path}")
+                    started = True
+                    pos += 1
+                    continue
+
+                if buffer[pos] == "]":
+                    return
+
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                    yield item
+                    continue
+                except json.JSONDecodeError:
+                    # Item is split across chunks, read more unless the file is exhausted
+                    if eof:
+                        raise
+
+            if eof:
+                raise ValueError(f"Unexpected end of JSON array in {path}")
+
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the objects of a JSONL file, skipping blank lines.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping invalid JSON on line {line_number} of {path}: {e}")
+
+
+def find_metadata_files(source: str) -> List[str]:
+    """
+    Resolve a source to metadata files. Directories are searched recursively for
+    *metadata*.json and *.jsonl files, so a folder of pipeline runs can be passed directly.
+    """
+    if os.path.isfile(source):
+        return [source]
+
+    if not os.path.isdir(source):
+        raise FileNotFoundError(f"Metadata source not found: {source}")
+
+    metadata_files = []
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".jsonl") or (name.endswith(".json") and "metadata" in name):
+                metadata_files.append(os.path.join(root, name))
+    return metadata_files
+
+
+def iter_metadata_source(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream metadata items from a single JSON or JSONL file, skipping items
+    that are missing any of the REQUIRED_FIELDS.
+    """
+    items = iter_jsonl(path) if path.endswith(".jsonl") else iter_json_array(path)
+    for item in items:
+        if not isinstance(item, dict) or not all(item.get(field) for field in REQUIRED_FIELDS):
+            logger.warning(f"Skipping metadata item without {', '.join(REQUIRED_FIELDS)} in {path}")
+            continue
+        yield item
+
+
+def get_item_version(item: Dict[str, Any], fallback: float) -> float:
+    """
+    Return the version of a metadata item from its first valid VERSION_FIELDS timestamp,
+    or the fallback (the source file's modification time) if it has none.
+    """
+    for field in VERSION_FIELDS:
+        value = item.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    return fallback
+
+
+def content_paths(source_path: str, video_id: str) -> Dict[str, str]:
+    """
+    Return the conventional article and key insights paths next to a metadata source.
+    """
+    directory = os.path.dirname(source_path)
+    return {
+        "article_path": os.path.join(directory, f"{video_id}_article.md"),
+        "insights_path": os.path.join(directory, f"{video_id}_keyInsights.json")
+    }
+
+
+class ContentStore:
+    """
+    Append-only sharded store of candidate metadata with a videoId index.
+    Readers reload the index whenever ingestion replaces it.
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self.index_path = os.path.join(store_dir, "index.json")
+        self.lock_path = os.path.join(store_dir, "writer.lock")
+        self._index: Optional[Dict[str, Any]] = None
+        self._index_signature: Optional[tuple] = None
+
+    def load_index(self) -> Dict[str, Any]:
+        """
+        Return the current index, reloading it if it changed on disk.
+        Raises FileNotFoundError if nothing has been ingested yet.
+        """
+        index_stat = os.stat(self.index_path)
+        index_signature = (index_stat.st_ino, index_stat.st_mtime_ns)
+        if self._index is None or index_signature != self._index_signature:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+            self._index_signature = index_signature
+            logger.info(f"Loaded content store index with {len(self._index['items'])} items")
+        return self._index
+
+    def _shard_path(self, index: Dict[str, Any], shard: int) -> str:
+        return os.path.join(self.store_dir, index["shard_dir"], f"shard-{shard:03d}.jsonl")
+
+    def get_entry(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the index entry (shard, offset, version, source and content paths) for a video.
+        Content paths are None unless the file existed next to this version's metadata.
+        """
+        index = self.load_index()
+        entry = index["items"].get(video_id)
+        if entry is None:
+            return None
+
+        source_path = index["sources"][entry[ENTRY_SOURCE]]["path"]
+        paths = content_paths(source_path, video_id)
+        return {
+            "shard": entry[ENTRY_SHARD],
+            "offset": entry[ENTRY_OFFSET],
+            "version": entry[ENTRY_VERSION],
+            "source": source_path,
+            "article_path": paths["article_path"] if entry[ENTRY_CONTENT] & HAS_ARTICLE else None,
+            "insights_path": paths["insights_path"] if entry[ENTRY_CONTENT] & HAS_INSIGHTS else None
+        }
+
+    def get_item(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored metadata for a video, or None if it is not in the store.
+        """
+        index = self.load_index()
+        entry = index["items"].get(video_id)
+        if entry is None:
+            return None
+
+        with open(self._shard_path(index, entry[ENTRY_SHARD]), 'rb') as f:
+            f.seek(entry[ENTRY_OFFSET])
+            return json.loads(f.readline())
+
+    def iter_items(self, sources: Optional[List[str]] = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the current version of stored items, one shard at a time, seeking
+        directly to each live record. sources restricts items to metadata files under
+        the given paths (files or run directories), and limit keeps only the newest
+        items by version.
+        """
+        index = self.load_index()
+        entries = index["items"].values()
+
+        if sources:
+            prefixes = [os.path.abspath(source) for source in sources]
+            source_ids = {
+                source_id
+                for source_id, source in enumerate(index["sources"])
+                if any(source["path"] == prefix or source["path"].startswith(prefix + os.sep) for prefix in prefixes)
+            }
+            entries = [entry for entry in entries if entry[ENTRY_SOURCE] in source_ids]
+
+        if limit is not None:
+            entries = heapq.nlargest(limit, entries, key=lambda entry: entry[ENTRY_VERSION])
+
+        live_offsets: Dict[int, List[int]] = {}
+        for entry in entries:
+            live_offsets.setdefault(entry[ENTRY_SHARD], []).append(entry[ENTRY_OFFSET])
+
+        for shard in sorted(live_offsets):
+            with open(self._shard_path(index, shard), 'rb') as f:
+                for offset in sorted(live_offsets[shard]):
+                    f.seek(offset)
+                    yield json.loads(f.readline())
+
+    @contextmanager
+    def writer_lock(self):
+        """
+        Hold the exclusive store writer lock, waiting for any other ingest or compaction.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self.lock_path, 'a+b') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info("Waiting for another content store writer to finish")
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        logger.info("Waiting for another content store writer to finish")
+
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _new_index(self, num_shards: int) -> Dict[str, Any]:
+        return {
+            "num_shards": num_shards,
+            "shard_dir": f"shards-{int(time.time() * 1000)}",
+            "sources": [],
+            "items": {}
+        }
+
+    def _write_index(self, index: Dict[str, Any]):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(temp_path, self.index_path)
+        self._index = None
+
+    def ingest(self, sources: List[str], num_shards: int = DEFAULT_NUM_SHARDS) -> Dict[str, int]:
+        """
+        Stream metadata sources into the store, keeping the newest version of each videoId.
+        Files unchanged since they were last ingested are skipped, and files that cannot
+        be parsed are logged and skipped without aborting the rest of the ingest.
+        """
+        with self.writer_lock():
+            return self._ingest(sources, num_shards)
+
+    def _ingest(self, sources: List[str], num_shards: int) -> Dict[str, int]:
+        try:
+            # Work on a private copy so readers never see a partially updated index
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = self._new_index(num_shards)
+
+        shard_dir = os.path.join(self.store_dir, index["shard_dir"])
+        os.makedirs(shard_dir, exist_ok=True)
+        source_ids = {source["path"]: source_id for source_id, source in enumerate(index["sources"])}
+        shard_files: Dict[int, Any] = {}
+        stats = {"read": 0, "stored": 0, "skipped": 0, "unchanged": 0, "skipped_files": 0}
+
+        try:
+            for source in sources:
+                for metadata_path in find_metadata_files(source):
+                    source_path = os.path.abspath(metadata_path)
+                    source_stat = os.stat(source_path)
+                    source_record = {
+                        "path": source_path,
+                        "mtime_ns": source_stat.st_mtime_ns,
+                        "size": source_stat.st_size
+                    }
+                    source_id = source_ids.get(source_path)
+                    if source_id is not None and index["sources"][source_id] == source_record:
+                        stats["skipped_files"] += 1
+                        continue
+                    if source_id is None:
+                        source_id = source_ids[source_path] = len(index["sources"])
+                        index["sources"].append(source_record)
+                    else:
+                        index["sources"][source_id] = source_record
+
+                    logger.info(f"Ingesting {metadata_path}")
+                    try:
+                        for item in iter_metadata_source(metadata_path):
+                            stats["read"] += 1
+                            video_id = str(item["videoId"])
+                            version = get_item_version(item, source_stat.st_mtime)
+                            existing = index["items"].get(video_id)
+                            if existing is not None and existing[ENTRY_VERSION] > version:
+                                stats["skipped"] += 1
+                                continue
+
+                            # Content paths only count if they belong to this version of the item
+                            paths = content_paths(source_path, video_id)
+                            content = (HAS_ARTICLE if os.path.exists(paths["article_path"]) else 0) \
+                                | (HAS_INSIGHTS if os.path.exists(paths["insights_path"]) else 0)
+                            record = json.dumps(item, separators=(",", ":")).encode("utf-8")
+                            record_hash = int.from_bytes(hashlib.blake2b(record, digest_size=8).digest(), "big")
+
+                            # A record re-read unchanged from the same source keeps its shard line
+                            if existing is not None and existing[ENTRY_SOURCE] == source_id \
+                                    and existing[ENTRY_HASH] == record_hash:
+                                existing[ENTRY_VERSION] = version
+                                existing[ENTRY_CONTENT] = content
+                                stats["unchanged"] += 1
+                                continue
+
+                            shard = zlib.crc32(video_id.encode("utf-8")) % index["num_shards"]
+                            if shard not in shard_files:
+                                shard_files[shard] = open(self._shard_path(index, shard), 'ab')
+                            shard_file = shard_files[shard]
+                            offset = shard_file.tell()
+                            shard_file.write(record + b"\n")
+                            index["items"][video_id] = [shard, offset, version, source_id, content, record_hash]
+                            stats["stored"] += 1
+                    except ValueError as e:
+                        # The file's stat is kept, so it is skipped until it changes
+                        logger.warning(f"Skipping metadata file that could not be parsed {metadata_path}: {e}")
+                    except OSError as e:
+                        logger.warning(f"Skipping unreadable metadata file {metadata_path}: {e}")
+                        # Forget the file's stat so it is read again on the next ingest
+                        index["sources"][source_id]["mtime_ns"] = None
+        finally:
+            for shard_file in shard_files.values():
+                shard_file.close()
+
+        # Shard writes are flushed before the index that points at them is swapped in
+        self._write_index(index)
+        logger.info(f"Ingestion complete: {stats['read']} read, {stats['stored']} stored, "
+                    f"{stats['skipped']} skipped as older, {stats['unchanged']} unchanged, "
+                    f"{stats['skipped_files']} unchanged files skipped, "
+                    f"{len(index['items'])} items in store")
+        return stats
+
+    def compact(self) -> int:
+        """
+        Rewrite the shards with only the current version of each item, dropping
+        superseded records. Returns the number of items kept.
+        The replaced shards stay on disk for readers still streaming them and are
+        removed by the next compaction.
+        """
+        with self.writer_lock():
+            return self._compact()
+
+    def _compact(self) -> int:
+        index = self.load_index()
+
+        # Shard directories retired by the previous compaction are no longer referenced
+        for name in os.listdir(self.store_dir):
+            if name.startswith("shards-") and name != index["shard_dir"]:
+                shutil.rmtree(os.path.join(self.store_dir, name), ignore_errors=True)
+
+        compacted = self._new_index(index["num_shards"])
+        compacted["sources"] = index["sources"]
+        os.makedirs(os.path.join(self.store_dir, compacted["shard_dir"]))
+        shard_files: Dict[int, Any] = {}
+
+        try:
+            for item in self.iter_items():
+                video_id = str(item["videoId"])
+                entry = list(index["items"][video_id])
+                if entry[ENTRY_SHARD] not in shard_files:
+                    shard_files[entry[ENTRY_SHARD]] = open(self._shard_path(compacted, entry[ENTRY_SHARD]), 'wb')
+                shard_file = shard_files[entry[ENTRY_SHARD]]
+                entry[ENTRY_OFFSET] = shard_file.tell()
+                shard_file.write(json.dumps(item, separators=(",", ":")).encode("utf-8") + b"\n")
+                compacted["items"][video_id] = entry
+        finally:
+            for shard_file in shard_files.values():
+                shard_file.close()
+
+        self._write_index(compacted)
+        logger.info(f"Compaction complete: {len(compacted['items'])} items kept")
+        return len(compacted["items"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="Manage the sharded content store")
+    parser.add_argument("--store-dir", default=os.getenv("CONTENT_STORE_DIR", DEFAULT_STORE_DIR))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest metadata files or pipeline run directories")
+    ingest_parser.add_argument("sources", nargs="+")
+    ingest_parser.add_argument("--num-shards", type=int, default=DEFAULT_NUM_SHARDS)
+    subparsers.add_parser("compact", help="Drop superseded records from the shards")
+    args = parser.parse_args()
+
+    store = ContentStore(args.store_dir)
+    if args.command == "ingest":
+        store.ingest(args.sources, num_shards=args.num_shards)
+    else:
+        store.compact()
@@ -1,13 +1,18 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import PlainTextResponse
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+from collections import deque
+import asyncio
 import json
 import os
+import time
 from dotenv import load_dotenv
 import anthropic
 import logging
+from content_store import ContentStore, DEFAULT_STORE_DIR
 
 # Load environment variables
 load_dotenv()
@@ -26,15 +31,49 @@ logger = logging.getLogger(__name__)
 claude_api_key = os.getenv("CLAUDE_API_KEY")
 claude_model = os.getenv("CLAUDE_MODEL", "claude-opus-4-1-20250805")
 
+# Optional model cascade for content ranking: a cheaper model scores the whole pool,
+# the primary model re-scores the top band and items near the cutoff
+claude_cascade_model = os.getenv("CLAUDE_CASCADE_MODEL", "")
+claude_cascade_top_k = int(os.getenv("CLAUDE_CASCADE_TOP_K", "10"))
+claude_cascade_margin = float(os.getenv("CLAUDE_CASCADE_MARGIN", "0.25"))
+CALIBRATION_MIN_SLOPE = 0.5
+CALIBRATION_MAX_SLOPE = 2.0
+
+# Content ranking prompts are split into batches so per-item reasoning fits in max_tokens
+claude_ranking_batch_size = int(os.getenv("CLAUDE_RANKING_BATCH_SIZE", "10"))
+claude_ranking_concurrency = int(os.getenv("CLAUDE_RANKING_CONCURRENCY", "4"))
+
+# Optional request hedging: a duplicate call is sent once a call runs past the given
+# percentile of recent latencies. Hedges are limited to a budgeted fraction of the
+# tokens requested (max_tokens) by recent calls, so expensive calls use up more of the budget
+claude_hedging_enabled = os.getenv("CLAUDE_HEDGING", "false").lower() == "true"
+claude_hedge_percentile = float(os.getenv("CLAUDE_HEDGE_PERCENTILE", "95"))
+claude_hedge_min_samples = int(os.getenv("CLAUDE_HEDGE_MIN_SAMPLES", "20"))
+claude_hedge_budget = float(os.getenv("CLAUDE_HEDGE_BUDGET", "0.1"))
+claude_hedge_history_size = int(os.getenv("CLAUDE_HEDGE_HISTORY_SIZE", "200"))
+claude_latency_history: Dict[str, deque] = {}
+claude_hedge_budget_window = int(os.getenv("CLAUDE_HEDGE_BUDGET_WINDOW", "200"))
+claude_hedge_spend: deque = deque(maxlen=claude_hedge_budget_window)  # [tokens, hedged_tokens] per recent call
+
 if not claude_api_key:
     logger.error("CLAUDE_API_KEY not found in environment variables")
     raise ValueError("CLAUDE_API_KEY not found in environment variables")
 
 logger.info(f"Initializing Claude client with model: {claude_model}")
-claude_client = anthropic.Anthropic(
+if claude_cascade_model:
+    logger.info(f"Content ranking cascade enabled with first pass model: {claude_cascade_model}")
+if claude_hedging_enabled:
+    logger.info(f"Request hedging enabled at p{claude_hedge_percentile:g} with budget {claude_hedge_budget:.0%}")
+claude_client = anthropic.AsyncAnthropic(
     api_key=claude_api_key
 )
 
+# Candidate metadata and content paths are served from the sharded content store,
+# populated with: python content_store.py ingest <metadata files or pipeline run directories>
+content_store_dir = os.getenv("CONTENT_STORE_DIR", DEFAULT_STORE_DIR)
+content_store = ContentStore(content_store_dir)
+content_pool_max_items = int(os.getenv("CONTENT_POOL_MAX_ITEMS", "100"))
+
 app = FastAPI()
 
 app.add_middleware(
@@ -80,6 +119,8 @@ class ContentPoolRequest(BaseModel):
     persona: str
     scoring_dimensions: str
     timestamp: str
+    sources: List[str] = []  # Restrict the pool to these metadata files or pipeline run directories
+    max_items: Optional[int] = Field(None, ge=1)  # Newest items to rank, capped at CONTENT_POOL_MAX_ITEMS
 
 @app.get("/")
 def read_root():
@@ -92,16 +133,11 @@ def health_check():
 @app.get("/api/video/{video_id}")
 def get_video_metadata(video_id: str):
     """
-    Get video metadata by videoId from the top10_metadata.json file.
+    Get video metadata by videoId from the content store.
     """
     try:
-        # Load candidates from top10_metadata.json
-        candidates_path = "/home/jianfengliu/rundown_pipeline/demo_0825/top10_metadata.json"
-        with open(candidates_path, 'r') as f:
-            candidates_data = json.load(f)
-        
-        # Find the video by ID
-        video = next((item for item in candidates_data if item["videoId"] == video_id), None)
+        # Look up the video by ID in the content store index
+        video = content_store.get_item(video_id)
         
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
@@ -111,7 +147,7 @@ def get_video_metadata(video_id: str):
             "video": video
         }
     except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Video metadata file not found")
+        raise HTTPException(status_code=500, detail="Content store not found")
     except Exception as e:
         logger.error(f"Error fetching video metadata: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch video metadata: {str(e)}")
@@ -119,12 +155,13 @@ def get_video_metadata(video_id: str):
 @app.get("/api/content/{video_id}/article", response_class=PlainTextResponse)
 def get_video_article(video_id: str):
     """
-    Get article content for a specific video from the demo_0825 directory.
+    Get article content for a specific video using the path recorded in the content store.
     """
     try:
-        article_path = f"/home/jianfengliu/rundown_pipeline/demo_0825/{video_id}_article.md"
+        entry = content_store.get_entry(video_id)
+        article_path = entry.get("article_path") if entry else None
         
-        if not os.path.exists(article_path):
+        if not article_path or not os.path.exists(article_path):
             raise HTTPException(status_code=404, detail="Article not found")
         
         with open(article_path, 'r', encoding='utf-8') as f:
@@ -140,12 +177,13 @@ def get_video_article(video_id: str):
 @app.get("/api/content/{video_id}/insights")
 def get_video_insights(video_id: str):
     """
-    Get key insights for a specific video from the demo_0825 directory.
+    Get key insights for a specific video using the path recorded in the content store.
     """
     try:
-        insights_path = f"/home/jianfengliu/rundown_pipeline/demo_0825/{video_id}_keyInsights.json"
+        entry = content_store.get_entry(video_id)
+        insights_path = entry.get("insights_path") if entry else None
         
-        if not os.path.exists(insights_path):
+        if not insights_path or not os.path.exists(insights_path):
             raise HTTPException(status_code=404, detail="Key insights not found")
         
         with open(insights_path, 'r', encoding='utf-8') as f:
@@ -239,31 +277,37 @@ async def generate_scoring_dimensions(persona_request: PersonaRequest):
         logger.error(f"Scoring dimensions generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate scoring dimensions: {str(e)}")
 
+def load_ranking_candidates(sources: List[str], limit: int) -> List[Dict[str, Any]]:
+    """
+    Read the candidate pool from the content store, keeping only the fields used for ranking.
+    """
+    candidates = []
+    for item in content_store.iter_items(sources=sources, limit=limit):
+        candidate = {
+            "videoId": item["videoId"],
+            "title": item["title"],
+            "author": item["author"],
+            "description": item.get("description", "")[:500] + "..." if len(item.get("description", "")) > 500 else item.get("description", "")  # Truncate long descriptions
+        }
+        candidates.append(candidate)
+    return candidates
+
 @app.post("/api/content-pool-ranking")
 async def content_pool_ranking(request: ContentPoolRequest):
     """
     Ranks content pool using persona and scoring dimensions.
-    Loads candidates from top10_metadata.json and evaluates using Claude API.
+    Streams candidates from the content store and evaluates using Claude API.
     """
     logger.info("=== CONTENT POOL RANKING ENDPOINT CALLED ===")
     logger.info(f"Persona length: {len(request.persona)} characters")
     logger.info(f"Scoring dimensions length: {len(request.scoring_dimensions)} characters")
     try:
-        # Load candidates from top10_metadata.json
-        candidates_path = "/home/jianfengliu/rundown_pipeline/demo_0825/top10_metadata.json"
-        with open(candidates_path, 'r') as f:
-            candidates_data = json.load(f)
-        
-        # Prepare candidates for ranking (extract only specified fields)
-        candidates_for_ranking = []
-        for item in candidates_data:
-            candidate = {
-                "videoId": item["videoId"],
-                "title": item["title"],
-                "author": item["author"],
-                "description": item.get("description", "")[:500] + "..." if len(item.get("description", "")) > 500 else item.get("description", "")  # Truncate long descriptions
-            }
-            candidates_for_ranking.append(candidate)
+        # Select the newest items from the requested sources, within the configured cap
+        pool_limit = min(request.max_items or content_pool_max_items, content_pool_max_items)
+        logger.info(f"Candidate pool: up to {pool_limit} items from {request.sources or 'all sources'}")
+        
+        # Prepare candidates for ranking off the event loop, so store reads do not stall other requests
+        candidates_for_ranking = await run_in_threadpool(load_ranking_candidates, request.sources, pool_limit)
         
         # Generate ranking using Claude API
         ranking_results = await rank_content_with_claude(candidates_for_ranking, request.scoring_dimensions)
@@ -293,6 +337,76 @@ async def content_pool_ranking(request: ContentPoolRequest):
         logger.error(f"Content pool ranking error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to rank content pool: {str(e)}")
 
+def get_hedge_deadline(history_key: str) -> Optional[float]:
+    """
+    Return the hedging deadline in seconds for a call type, taken from its recent latency history.
+    Returns None until enough samples have been recorded.
+    """
+    history = claude_latency_history.get(history_key)
+    if not history or len(history) < claude_hedge_min_samples:
+        return None
+    
+    ordered = sorted(history)
+    index = min(len(ordered) - 1, int(len(ordered) * claude_hedge_percentile / 100))
+    return ordered[index]
+
+async def create_claude_message(label: str, **kwargs):
+    """
+    Call the Claude messages API, hedging with a duplicate request when hedging is enabled
+    and the call runs past its latency deadline. The first successful response wins and
+    any outstanding request is cancelled.
+    """
+    history_key = f"{label}:{kwargs.get('model')}"
+    max_tokens = kwargs.get("max_tokens", 0)
+    call_spend = [max_tokens, 0]
+    claude_hedge_spend.append(call_spend)
+    
+    # Latency is recorded per request from its own start, so a winning hedge
+    # does not add the deadline it waited for to the history
+    start_times = {}
+    
+    def start_request():
+        task = asyncio.create_task(claude_client.messages.create(**kwargs))
+        start_times[task] = time.monotonic()
+        return task
+    
+    pending = {start_request()}
+    errors = []
+    
+    try:
+        deadline = get_hedge_deadline(history_key) if claude_hedging_enabled else None
+        if deadline is not None:
+            done, _ = await asyncio.wait(pending, timeout=deadline)
+            window_tokens = sum(tokens for tokens, _ in claude_hedge_spend)
+            hedged_tokens = sum(hedged for _, hedged in claude_hedge_spend) + max_tokens
+            within_budget = hedged_tokens <= claude_hedge_budget * window_tokens
+            if not done and within_budget:
+                call_spend[1] = max_tokens
+                logger.info(f"Hedging {label} call after {deadline:.2f}s "
+                            f"({hedged_tokens}/{window_tokens} recently requested tokens spent on hedges)")
+                pending.add(start_request())
+            elif not done:
+                logger.info(f"Not hedging {label} call after {deadline:.2f}s, hedge budget exhausted")
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                    continue
+                
+                history = claude_latency_history.setdefault(history_key, deque(maxlen=claude_hedge_history_size))
+                history.append(time.monotonic() - start_times[task])
+                return task.result()
+        
+        raise errors[0]
+    
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
 async def generate_persona_with_claude(profile: UserProfile) -> str:
     """
     Generate a personalized AI agent persona using Claude API.
@@ -395,7 +509,8 @@ Format your entire response using the following Markdown structure. Do NOT inclu
         logger.info("="*50)
 
         # Call Claude API
-        message = claude_client.messages.create(
+        message = await create_claude_message(
+            "persona",
             model=claude_model,
             max_tokens=1000,
             temperature=0.7,
@@ -543,7 +658,8 @@ Note: Weights must total 100%. Include brief focus points under each dimension i
         logger.info("="*50)
 
         # Call Claude API
-        message = claude_client.messages.create(
+        message = await create_claude_message(
+            "scoring_dimensions",
             model=claude_model,
             max_tokens=1500,
             temperature=0.7,
@@ -576,15 +692,16 @@ Note: Weights must total 100%. Include brief focus points under each dimension i
 
 
 
-async def rank_content_with_claude(candidates: List[Dict[Any, Any]], framework: str) -> Dict[str, Any]:
+async def score_content_batch_with_claude(candidates: List[Dict[Any, Any]], framework: str, model: str) -> tuple:
     """
-    Rank content using Claude API with the specified evaluation framework.
+    Score one batch of content with a single Claude call using the specified evaluation framework.
+    Returns the parsed list of scored items (None if the response could not be parsed)
+    together with the raw response text.
     """
-    try:
-        # Prepare the ranking prompt
-        candidates_json = json.dumps(candidates, indent=2)
-        
-        prompt = f"""You are an expert in evaluating and ranking content for AI-native product builders.  
+    # Prepare the ranking prompt
+    candidates_json = json.dumps(candidates, indent=2)
+    
+    prompt = f"""You are an expert in evaluating and ranking content for AI-native product builders.  
 Your task is to assess each item in the candidates list using the evaluation framework below.  
 
 For every content item:  
@@ -632,75 +749,272 @@ Return only a JSON array of objects in this format (dimensions adapt dynamically
 ]
 ```"""
 
-        # Log input
-        logger.info("\n" + "="*50)
-        logger.info("CLAUDE API CALL INPUT - CONTENT RANKING")
-        logger.info("="*50)
-        logger.info(f"Model: {claude_model}")
-        logger.info(f"Temperature: 0.3")
-        logger.info(f"Max Tokens: 3000")
-        logger.info(f"Candidates count: {len(candidates)}")
-        logger.info("\n--- CONTENT RANKING PROMPT START ---")
-        logger.info(prompt)
-        logger.info("--- CONTENT RANKING PROMPT END ---")
-        logger.info("="*50)
-
-        # Call Claude API
-        message = claude_client.messages.create(
-            model=claude_model,
-            max_tokens=3000,
-            temperature=0.3,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
-        
-        response_text = message.content[0].text
+    # Log input
+    logger.info("\n" + "="*50)
+    logger.info("CLAUDE API CALL INPUT - CONTENT RANKING")
+    logger.info("="*50)
+    logger.info(f"Model: {model}")
+    logger.info(f"Temperature: 0.3")
+    logger.info(f"Max Tokens: 3000")
+    logger.info(f"Candidates count: {len(candidates)}")
+    logger.info("\n--- CONTENT RANKING PROMPT START ---")
+    logger.info(prompt)
+    logger.info("--- CONTENT RANKING PROMPT END ---")
+    logger.info("="*50)
+
+    # Call Claude API
+    message = await create_claude_message(
+        "content_ranking",
+        model=model,
+        max_tokens=3000,
+        temperature=0.3,
+        messages=[
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    )
+    
+    response_text = message.content[0].text
+    
+    # Log output
+    logger.info("\n" + "="*50)
+    logger.info("CLAUDE API CALL OUTPUT - CONTENT RANKING")
+    logger.info("="*50)
+    logger.info(f"Response length: {len(response_text)} characters")
+    logger.info("\n--- CONTENT RANKING RESPONSE START ---")
+    logger.info(response_text)
+    logger.info("--- CONTENT RANKING RESPONSE END ---")
+    logger.info("="*50 + "\n")
+    
+    # Parse JSON response
+    try:
+        # Extract JSON from response (handle potential markdown code blocks)
+        if "```json" in response_text:
+            json_start = response_text.find("```json") + 7
+            json_end = response_text.find("```", json_start)
+            json_text = response_text[json_start:json_end].strip()
+        elif "[" in response_text:
+            json_start = response_text.find("[")
+            json_end = response_text.rfind("]") + 1
+            json_text = response_text[json_start:json_end]
+        else:
+            json_text = response_text
+            
+        ranking_data = json.loads(json_text)
         
-        # Log output
-        logger.info("\n" + "="*50)
-        logger.info("CLAUDE API CALL OUTPUT - CONTENT RANKING")
-        logger.info("="*50)
-        logger.info(f"Response length: {len(response_text)} characters")
-        logger.info("\n--- CONTENT RANKING RESPONSE START ---")
-        logger.info(response_text)
-        logger.info("--- CONTENT RANKING RESPONSE END ---")
-        logger.info("="*50 + "\n")
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse Claude response as JSON: {e}")
+        logger.error(f"Raw response: {response_text}")
+        return None, response_text
+    
+    if not isinstance(ranking_data, list) or not all(isinstance(item, dict) for item in ranking_data):
+        logger.error("Claude ranking response is not a JSON array of objects")
+        logger.error(f"Raw response: {response_text}")
+        return None, response_text
+    
+    # Record which model produced each score
+    for item in ranking_data:
+        item["scored_by"] = model
+    
+    return ranking_data, response_text
+
+async def score_content_with_claude(candidates: List[Dict[Any, Any]], framework: str, model: str) -> tuple:
+    """
+    Score content with a single Claude model, split into batches of CLAUDE_RANKING_BATCH_SIZE
+    items that run concurrently. Returns the scored items from every batch that succeeded
+    (None if no batch did) together with the raw responses or errors of the batches that failed.
+    A batch fails if its API call raises or its response cannot be parsed.
+    """
+    batches = [
+        candidates[start:start + claude_ranking_batch_size]
+        for start in range(0, len(candidates), claude_ranking_batch_size)
+    ]
+    semaphore = asyncio.Semaphore(claude_ranking_concurrency)
+    
+    async def score_batch(batch):
+        async with semaphore:
+            return await score_content_batch_with_claude(batch, framework, model)
+    
+    logger.info(f"Scoring {len(candidates)} items with {model} in {len(batches)} batches")
+    results = await asyncio.gather(*(score_batch(batch) for batch in batches), return_exceptions=True)
+    
+    ranking_data = []
+    failed_responses = []
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Claude API error for content ranking batch: {result}")
+            failed_responses.append(f"{type(result).__name__}: {result}")
+            continue
         
-        # Parse JSON response
-        try:
-            # Extract JSON from response (handle potential markdown code blocks)
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            elif "[" in response_text:
-                json_start = response_text.find("[")
-                json_end = response_text.rfind("]") + 1
-                json_text = response_text[json_start:json_end]
-            else:
-                json_text = response_text
-                
-            ranking_data = json.loads(json_text)
-            
+        batch_data, response_text = result
+        if batch_data is None:
+            failed_responses.append(response_text)
+        else:
+            ranking_data.extend(batch_data)
+    
+    if failed_responses:
+        logger.warning(f"{len(failed_responses)} of {len(batches)} ranking batches failed")
+    
+    return (ranking_data if len(failed_responses) < len(batches) else None), failed_responses
+
+def get_weighted_score(item: Dict[str, Any]) -> float:
+    """
+    Read an item's final weighted score, treating missing or malformed values as 0.
+    """
+    try:
+        return float(item.get("final_weighted_score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def fit_score_calibration(pairs: List[tuple]) -> Dict[str, float]:
+    """
+    Fit a linear map from first-pass scores to primary model scores.
+    Falls back to a plain mean offset when there are too few points to fit a slope,
+    or when the fitted slope would not preserve the first-pass ordering. The slope is
+    bounded because the fit only sees the narrow top band of scores.
+    """
+    if not pairs:
+        return {"slope": 1.0, "intercept": 0.0, "min_score": 0.0}
+    
+    n = len(pairs)
+    mean_x = sum(x for x, _ in pairs) / n
+    mean_y = sum(y for _, y in pairs) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in pairs)
+    slope = 1.0
+    
+    if n >= 2 and var_x > 0:
+        fitted_slope = sum((x - mean_x) * (y - mean_y) for x, y in pairs) / var_x
+        if fitted_slope > 0:
+            slope = min(CALIBRATION_MAX_SLOPE, max(CALIBRATION_MIN_SLOPE, fitted_slope))
+            if slope != fitted_slope:
+                logger.warning(f"Cascade calibration slope {fitted_slope:.3f} clamped to {slope:.3f}")
+    
+    return {
+        "slope": slope,
+        "intercept": mean_y - slope * mean_x,
+        "min_score": min(x for x, _ in pairs)
+    }
+
+def apply_score_calibration(score: float, calibration: Dict[str, float]) -> float:
+    """
+    Map a first-pass score onto the primary model's scale. Below the fitted range the
+    score keeps its first-pass distance from the lower edge instead of extrapolating the slope.
+    """
+    anchor = max(score, calibration["min_score"])
+    calibrated = calibration["slope"] * anchor + calibration["intercept"] - (anchor - score)
+    return round(min(5.0, max(1.0, calibrated)), 2)
+
+async def rank_content_with_cascade(candidates: List[Dict[Any, Any]], framework: str) -> Dict[str, Any]:
+    """
+    Rank content with a two-stage model cascade.
+    The cascade model scores the whole pool in batches, then the top band and any items within
+    the margin of the cutoff are re-scored by the primary model. Scores for items only
+    seen by the cascade model are calibrated onto the primary model's scale.
+    """
+    first_pass, _ = await score_content_with_claude(candidates, framework, claude_cascade_model)
+    
+    if first_pass is None:
+        logger.warning("Cascade first pass could not be parsed, scoring full pool with primary model")
+        return None
+    
+    first_pass.sort(key=get_weighted_score, reverse=True)
+    cutoff_index = min(claude_cascade_top_k, len(first_pass)) - 1
+    cutoff_score = get_weighted_score(first_pass[cutoff_index])
+    contested_ids = {
+        item.get("videoId")
+        for index, item in enumerate(first_pass)
+        if index <= cutoff_index or get_weighted_score(item) >= cutoff_score - claude_cascade_margin
+    }
+    contested_candidates = [c for c in candidates if c["videoId"] in contested_ids]
+    
+    logger.info(f"Cascade first pass scored {len(first_pass)} items with {claude_cascade_model}")
+    logger.info(f"Cascade cutoff score: {cutoff_score:.2f}, re-scoring {len(contested_candidates)} items with {claude_model}")
+    
+    rescored, _ = await score_content_with_claude(contested_candidates, framework, claude_model)
+    
+    if rescored is None:
+        logger.warning("Cascade re-scoring could not be parsed, keeping first pass scores")
+        rescored = []
+    
+    # Calibrate first pass scores against the primary model on the overlapping items
+    first_pass_scores = {item.get("videoId"): get_weighted_score(item) for item in first_pass}
+    rescored_ids = {item.get("videoId") for item in rescored}
+    pairs = [
+        (first_pass_scores[item.get("videoId")], get_weighted_score(item))
+        for item in rescored
+        if item.get("videoId") in first_pass_scores
+    ]
+    calibration = fit_score_calibration(pairs)
+    logger.info(f"Cascade calibration: slope={calibration['slope']:.3f}, intercept={calibration['intercept']:.3f} "
+                f"from {len(pairs)} items")
+    
+    merged = list(rescored)
+    for item in first_pass:
+        if item.get("videoId") in rescored_ids:
+            continue
+        raw_score = get_weighted_score(item)
+        item["raw_weighted_score"] = raw_score
+        item["final_weighted_score"] = apply_score_calibration(raw_score, calibration)
+        merged.append(item)
+    
+    merged.sort(key=get_weighted_score, reverse=True)
+    
+    cascade_results = {
+        "ranked_content": merged,
+        "total_items": len(candidates),
+        "processing_summary": f"Successfully ranked {len(merged)} of {len(candidates)} content items using Claude API "
+                              f"({len(rescored)} re-scored by {claude_model})",
+        "cascade": {
+            "first_pass_model": claude_cascade_model,
+            "primary_model": claude_model,
+            "cutoff_score": cutoff_score,
+            "rescored_items": len(rescored),
+            "calibration": {key: round(value, 4) for key, value in calibration.items()}
+        }
+    }
+    if len(merged) < len(candidates):
+        cascade_results["unscored_items"] = len(candidates) - len(merged)
+    return cascade_results
+
+async def rank_content_with_claude(candidates: List[Dict[Any, Any]], framework: str) -> Dict[str, Any]:
+    """
+    Rank content using Claude API with the specified evaluation framework.
+    Uses the model cascade when CLAUDE_CASCADE_MODEL is set and the pool is larger than the top band.
+    """
+    try:
+        if not candidates:
+            logger.info("No candidates to rank")
             return {
-                "ranked_content": ranking_data,
-                "total_items": len(candidates),
-                "processing_summary": f"Successfully ranked {len(candidates)} content items using Claude API"
+                "ranked_content": [],
+                "total_items": 0,
+                "processing_summary": "No candidates to rank"
             }
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Claude response as JSON: {e}")
-            logger.error(f"Raw response: {response_text}")
+        
+        if claude_cascade_model and len(candidates) > claude_cascade_top_k:
+            cascade_results = await rank_content_with_cascade(candidates, framework)
+            if cascade_results is not None:
+                return cascade_results
+        
+        ranking_data, failed_responses = await score_content_with_claude(candidates, framework, claude_model)
+        
+        if ranking_data is None:
             return {
-                "error": "Failed to parse ranking results",
-                "raw_response": response_text,
+                "error": "Failed to score ranking results",
+                "raw_response": "\n\n".join(failed_responses),
                 "total_items": len(candidates)
             }
         
+        results = {
+            "ranked_content": ranking_data,
+            "total_items": len(candidates),
+            "processing_summary": f"Successfully ranked {len(ranking_data)} of {len(candidates)} content items using Claude API"
+        }
+        if failed_responses:
+            results["unscored_items"] = len(candidates) - len(ranking_data)
+        return results
+        
     except Exception as e:
         logger.error(f"Claude API error for content ranking: {e}")
         raise e
@@ -709,6 +1023,10 @@ Return only a JSON array of objects in this format (dimensions adapt dynamically
 if __name__ == "__main__":
     logger.info("Starting FastAPI server with logging enabled")
     logger.info(f"Claude model: {claude_model}")
+    logger.info(f"Claude cascade model: {claude_cascade_model or 'Disabled'}")
+    logger.info(f"Claude request hedging: {'Enabled' if claude_hedging_enabled else 'Disabled'}")
+    logger.info(f"Content store directory: {content_store_dir}")
+    logger.info(f"Content pool max items: {content_pool_max_items}")
     logger.info(f"Claude API key configured: {'Yes' if claude_api_key else 'No'}")
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file